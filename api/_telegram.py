@@ -0,0 +1,635 @@
+"""
+Telegram Bot API side of the webhook app: update models, the shared HTTP
+client, outbound batching and command handlers.
+
+Imported lazily by api/telegram_webhook.py so routes that don't talk to
+Telegram (/, /health) never pay for httpx or the Pydantic models.
+"""
+import asyncio
+from fastapi import HTTPException
+import httpx
+import logging
+import orjson
+import os
+import re
+import time
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable
+from pydantic import BaseModel, ConfigDict, Field
+
+# Configuration - Use environment variables
+BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', 'YOUR_BOT_TOKEN_HERE')
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL', 'https://your-app.vercel.app/api/telegram_webhook')
+
+logger = logging.getLogger("telegram_webhook")
+
+# Telegram API base URL
+TELEGRAM_API_BASE = f"https://api.telegram.org/bot{BOT_TOKEN}"
+
+# Bot API method paths, relative to the shared client's base_url
+SEND_MESSAGE_PATH = "/sendMessage"
+ANSWER_CB_PATH = "/answerCallbackQuery"
+SET_WEBHOOK_PATH = "/setWebhook"
+DELETE_WEBHOOK_PATH = "/deleteWebhook"
+GET_WEBHOOK_INFO_PATH = "/getWebhookInfo"
+
+# Outbound limits - cap concurrent Telegram calls and bound each call / update
+MAX_INFLIGHT = int(os.environ.get('TG_MAX_INFLIGHT', '50'))
+OUTBOUND_TIMEOUT = 8.0
+# Each reply must reach Telegram within this long of being queued, under
+# Vercel's 10s function limit; the batcher drops replies past it
+UPDATE_TIMEOUT = 9.0
+# The callback handler awaits its sendMessage and answerCallbackQuery directly,
+# so it is bounded on its own
+CALLBACK_TIMEOUT = 9.0
+
+# Outbound batching - consecutive replies to one chat are merged into a single sendMessage
+FLUSH_MS = int(os.environ.get('TELEGRAM_FLUSH_MS', '200'))
+LONG_CHUNK_FLUSH_MS = 1000
+LONG_CHUNK_LENGTH = 3500
+FLUSH_LENGTH = 3900
+MAX_MESSAGE_LENGTH = 4096
+HTML_TAG_RE = re.compile(r'<(/?)([a-zA-Z-]+)[^>]*>')
+
+# Pydantic models for type validation
+class TelegramUser(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+
+    id: int
+    first_name: str
+    last_name: Optional[str] = None
+    username: Optional[str] = None
+
+class TelegramChat(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+
+    id: int
+    type: str
+    title: Optional[str] = None
+    first_name: Optional[str] = None
+
+class TelegramMessage(BaseModel):
+    model_config = ConfigDict(populate_by_name=True, extra='ignore')
+
+    message_id: int
+    from_: Optional[TelegramUser] = Field(default=None, alias='from')
+    chat: TelegramChat
+    date: int
+    text: Optional[str] = None
+
+class CallbackQuery(BaseModel):
+    model_config = ConfigDict(populate_by_name=True, extra='ignore')
+
+    id: str
+    from_: TelegramUser = Field(alias='from')
+    message: Optional[TelegramMessage] = None
+    data: Optional[str] = None
+
+class TelegramUpdate(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+
+    update_id: int
+    message: Optional[TelegramMessage] = None
+    callback_query: Optional[CallbackQuery] = None
+
+
+# Shared HTTP client, created on first use and kept alive until app shutdown
+# so every Telegram API call reuses pooled connections instead of a new TLS handshake
+# The client and semaphore are bound to the loop they were created on; a
+# per-request loop (as on Vercel) gets fresh ones instead of dead connections
+http_client: Optional[httpx.AsyncClient] = None
+outbound_sem: Optional[asyncio.Semaphore] = None
+state_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def check_loop():
+    """
+    Drop loop-bound state created on a different event loop
+    """
+    global http_client, outbound_sem, state_loop
+    loop = asyncio.get_running_loop()
+    if state_loop is not loop:
+        http_client = None
+        outbound_sem = None
+        state_loop = loop
+
+def get_http_client() -> httpx.AsyncClient:
+    global http_client
+    check_loop()
+    if http_client is None:
+        http_client = httpx.AsyncClient(
+            base_url=TELEGRAM_API_BASE,
+            http2=True,
+            # Bound every leg so a hung Telegram edge can't outlive Vercel's function limit
+            timeout=httpx.Timeout(connect=3.0, read=10.0, write=5.0, pool=5.0),
+            limits=httpx.Limits(
+                max_keepalive_connections=20,
+                max_connections=100,
+                keepalive_expiry=30.0
+            )
+        )
+    return http_client
+
+def get_outbound_sem() -> asyncio.Semaphore:
+    global outbound_sem
+    check_loop()
+    if outbound_sem is None:
+        outbound_sem = asyncio.Semaphore(MAX_INFLIGHT)
+    return outbound_sem
+
+async def aclose():
+    """
+    Flush queued replies and close the shared HTTP client
+    """
+    global http_client, outbound_sem, state_loop
+    await outbound.drain()
+    # A client left on an earlier loop can't be closed from this one; drop it
+    if http_client is not None and state_loop is asyncio.get_running_loop():
+        await http_client.aclose()
+    http_client = None
+    outbound_sem = None
+    state_loop = None
+
+JSON_HEADERS = {"content-type": "application/json"}
+
+async def telegram_call(
+    client: httpx.AsyncClient,
+    path: str,
+    data: Optional[Dict[str, Any]] = None,
+    method: str = "POST",
+    timeout: float = OUTBOUND_TIMEOUT
+) -> Dict[str, Any]:
+    """
+    Call a Telegram API method with an orjson-encoded payload and decode the reply
+    """
+    kwargs = {} if data is None else {"content": orjson.dumps(data), "headers": JSON_HEADERS}
+
+    # The timeout covers waiting for a semaphore slot as well as the request
+    async def request() -> httpx.Response:
+        async with get_outbound_sem():
+            return await client.request(method, path, **kwargs)
+
+    response = await asyncio.wait_for(request(), timeout=timeout)
+    return orjson.loads(response.content)
+
+# Strong references to in-flight update tasks so they aren't GC'd mid-flight
+background_tasks = set()
+
+def parse_update(body: bytes) -> Optional[TelegramUpdate]:
+    """
+    Decode a webhook body, returning None for updates the bot doesn't handle
+    """
+    update = orjson.loads(body)
+    if not isinstance(update, dict):
+        raise ValueError("Update is not a JSON object")
+
+    # Only text messages and callback queries are handled, so validate just
+    # that nested object and skip model construction for everything else
+    if "message" in update:
+        if "text" not in update["message"]:
+            return None
+        return TelegramUpdate.model_construct(
+            update_id=update.get("update_id"),
+            message=TelegramMessage.model_validate(update["message"])
+        )
+    elif "callback_query" in update:
+        return TelegramUpdate.model_construct(
+            update_id=update.get("update_id"),
+            callback_query=CallbackQuery.model_validate(update["callback_query"])
+        )
+    return None
+
+def schedule_update(update: TelegramUpdate):
+    """
+    Process the update in the background so Telegram gets its 200 right away
+    """
+    task = asyncio.create_task(process_telegram_update(update))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+async def webhook_setup(action: str, secret_token: str = ""):
+    """
+    Manage the Telegram webhook
+    - action=set: Set the webhook
+    - action=delete: Delete the webhook  
+    - action=info: Get webhook information
+    """
+    try:
+        if action == "set":
+            # Set webhook
+            data = {
+                "url": f"{WEBHOOK_URL}/webhook",
+                "allowed_updates": ["message", "callback_query"]
+            }
+            if secret_token:
+                data["secret_token"] = secret_token
+            
+            result = await telegram_call(get_http_client(), SET_WEBHOOK_PATH, data)
+            
+            if result.get("ok"):
+                return {
+                    "status": "Webhook set successfully",
+                    "webhook_url": f"{WEBHOOK_URL}/webhook",
+                    "result": result
+                }
+            else:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Failed to set webhook: {result}"
+                )
+        
+        elif action == "delete":
+            # Delete webhook
+            result = await telegram_call(get_http_client(), DELETE_WEBHOOK_PATH)
+            
+            return {
+                "status": "Webhook deleted",
+                "result": result
+            }
+        
+        else:
+            # Get webhook info
+            result = await telegram_call(get_http_client(), GET_WEBHOOK_INFO_PATH, method="GET")
+            
+            return {
+                "webhook_info": result.get("result", {}),
+                "instructions": {
+                    "set_webhook": f"{WEBHOOK_URL}/setup?action=set",
+                    "delete_webhook": f"{WEBHOOK_URL}/setup?action=delete"
+                }
+            }
+            
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=500, detail=f"Request error: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def process_telegram_update(update: TelegramUpdate):
+    """
+    Process incoming Telegram updates
+    """
+    try:
+        # Message replies only queue on the batcher, which enforces UPDATE_TIMEOUT
+        if update.message:
+            await handle_message(update.message)
+        elif update.callback_query:
+            await asyncio.wait_for(handle_callback_query(update.callback_query), timeout=CALLBACK_TIMEOUT)
+            
+    except asyncio.TimeoutError:
+        logger.warning("Dropped update %s after %ss", update.update_id, CALLBACK_TIMEOUT)
+    except Exception:
+        logger.exception("Error processing update")
+
+# Static command responses
+START_TEMPLATE = "🤖 Hello {user_name}! Welcome to the bot!\n\nUse /help to see available commands."
+
+HELP_TEXT = """📋 <b>Available Commands:</b>
+
+/start - Start the bot
+/help - Show this help message
+/echo [text] - Echo your message
+/status - Check bot status
+/keyboard - Show sample keyboard
+/info - Get your user info"""
+
+STATUS_TEXT = "✅ Bot is running perfectly!\n\n🚀 FastAPI + Vercel deployment active"
+
+ECHO_USAGE_TEXT = "Please provide text to echo!\n\nExample: <code>/echo Hello World</code>"
+
+KEYBOARD_TEXT = "🎛️ <b>Sample Keyboard</b>\n\nChoose an option below:"
+
+# Sample inline keyboard, serialized once so each /keyboard reply reuses the bytes
+SAMPLE_KEYBOARD = [
+    [
+        {"text": "🔵 Button 1", "callback_data": "btn1"},
+        {"text": "🟢 Button 2", "callback_data": "btn2"}
+    ],
+    [
+        {"text": "❓ Help", "callback_data": "help"},
+        {"text": "ℹ️ About", "callback_data": "about"}
+    ]
+]
+SAMPLE_REPLY_MARKUP_JSON = orjson.dumps({"inline_keyboard": SAMPLE_KEYBOARD})
+
+def get_user_name(message: TelegramMessage) -> str:
+    return message.from_.first_name if message.from_ else "User"
+
+async def cmd_start(message: TelegramMessage, args: str):
+    await send_message(message.chat.id, START_TEMPLATE.format(user_name=get_user_name(message)))
+
+async def cmd_help(message: TelegramMessage, args: str):
+    await send_message(message.chat.id, HELP_TEXT)
+
+async def cmd_echo(message: TelegramMessage, args: str):
+    echo_text = args.strip()
+    response_text = f"🔄 You said: <i>{echo_text}</i>" if echo_text else ECHO_USAGE_TEXT
+    await send_message(message.chat.id, response_text)
+
+async def cmd_status(message: TelegramMessage, args: str):
+    await send_message(message.chat.id, STATUS_TEXT)
+
+async def cmd_keyboard(message: TelegramMessage, args: str):
+    await send_message_with_keyboard(message.chat.id, KEYBOARD_TEXT, SAMPLE_REPLY_MARKUP_JSON)
+
+async def cmd_info(message: TelegramMessage, args: str):
+    chat_id = message.chat.id
+    if message.from_:
+        info_text = f"""👤 <b>Your Information:</b>
+
+🆔 User ID: <code>{message.from_.id}</code>
+👋 Name: {message.from_.first_name}
+💬 Chat ID: <code>{chat_id}</code>
+"""
+        if message.from_.username:
+            info_text += f"📝 Username: @{message.from_.username}\n"
+    else:
+        info_text = "ℹ️ User information not available"
+
+    await send_message(chat_id, info_text)
+
+async def cmd_default(message: TelegramMessage, args: str):
+    response_text = f"👋 Hello {get_user_name(message)}!\n\n💬 You sent: <i>{message.text or ''}</i>\n\nUse /help to see available commands."
+    await send_message(message.chat.id, response_text)
+
+# "/command[@botname] [args]" - splits command name and arguments in one match
+COMMAND_RE = re.compile(r'^/(\w+)(?:@\w+)?(?:\s+(?P<args>.*))?$', re.DOTALL)
+
+# Command name -> handler
+COMMANDS: Dict[str, Callable[[TelegramMessage, str], Awaitable[None]]] = {
+    'start': cmd_start,
+    'help': cmd_help,
+    'echo': cmd_echo,
+    'status': cmd_status,
+    'keyboard': cmd_keyboard,
+    'info': cmd_info,
+}
+
+async def handle_message(message: TelegramMessage):
+    """
+    Handle text messages
+    """
+    text = message.text or ""
+    match = COMMAND_RE.match(text)
+    if match:
+        handler = COMMANDS.get(match.group(1).lower(), cmd_default)
+        await handler(message, match.group('args') or '')
+    else:
+        await cmd_default(message, text)
+
+# Callback data -> reply text
+CALLBACK_RESPONSES: Dict[str, str] = {
+    "btn1": "🔵 You clicked Button 1!",
+    "btn2": "🟢 You clicked Button 2!",
+    "help": "❓ This is the help section from inline keyboard!",
+    "about": "ℹ️ This bot is built with FastAPI and deployed on Vercel!",
+}
+
+CALLBACK_ANSWER_TEXT = "✅ Action completed!"
+
+async def handle_callback_query(callback_query: CallbackQuery):
+    """
+    Handle callback queries from inline keyboards
+    """
+    chat_id = callback_query.message.chat.id if callback_query.message else callback_query.from_.id
+    data = callback_query.data
+    
+    response_text = CALLBACK_RESPONSES.get(data) or f"🎯 You clicked: {data}"
+    
+    # Post the reply directly rather than through the batcher so both calls
+    # are in flight together, multiplexed on the one HTTP/2 connection
+    await asyncio.gather(
+        post_message(chat_id, response_text),
+        answer_callback_query(callback_query.id, CALLBACK_ANSWER_TEXT)
+    )
+
+def has_open_tags(text: str) -> bool:
+    """
+    Check whether HTML markup in the text is left unbalanced
+    """
+    open_tags = []
+    for closing, tag in HTML_TAG_RE.findall(text):
+        tag = tag.lower()
+        if not closing:
+            open_tags.append(tag)
+        elif open_tags and open_tags[-1] == tag:
+            open_tags.pop()
+        else:
+            return True
+    return bool(open_tags)
+
+def unclosed_tags(text: str) -> List[Tuple[str, str]]:
+    """
+    Return (name, opening tag) for each tag still open at the end of the text
+    """
+    stack = []
+    for match in HTML_TAG_RE.finditer(text):
+        closing, tag = match.group(1), match.group(2).lower()
+        if not closing:
+            stack.append((tag, match.group(0)))
+        elif stack and stack[-1][0] == tag:
+            stack.pop()
+    return stack
+
+def find_cut(text: str, limit: int) -> int:
+    """
+    Pick a split point within limit on a word boundary, never inside a tag or entity
+    """
+    cut = max(text.rfind('\n', 0, limit), text.rfind(' ', 0, limit))
+    if cut <= 0:
+        cut = limit
+    tag_start = text.rfind('<', 0, cut)
+    if tag_start > text.rfind('>', 0, cut) and tag_start > 0:
+        cut = tag_start
+    entity_start = text.rfind('&', 0, cut)
+    if entity_start > text.rfind(';', 0, cut) and entity_start > 0:
+        cut = entity_start
+    return cut
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """
+    Split text into chunks within Telegram's length cap, on word boundaries.
+
+    Tags open at a split are closed at the end of the chunk and reopened at
+    the start of the next one, so every chunk is valid HTML on its own.
+    """
+    chunks = []
+    while len(text) > limit:
+        budget = limit
+        while True:
+            cut = find_cut(text, budget)
+            chunk = text[:cut]
+            open_tags = unclosed_tags(chunk)
+            closing = "".join(f"</{tag}>" for tag, _ in reversed(open_tags))
+            if len(chunk) + len(closing) <= limit or budget <= len(closing):
+                break
+            budget = limit - len(closing)
+        reopening = "".join(opening for _, opening in open_tags)
+        # Pathologically long tag prefixes would stop the text from shrinking
+        if len(reopening) >= cut:
+            closing = reopening = ""
+        chunks.append(chunk + closing)
+        text = reopening + text[cut:].lstrip()
+    chunks.append(text)
+    return chunks
+
+class OutboundBatcher:
+    """
+    Per-chat outbound queue that joins consecutive text replies into one sendMessage
+    """
+    def __init__(self, flush_ms: int = FLUSH_MS):
+        self.flush_delay = flush_ms / 1000
+        self.queues: Dict[int, asyncio.Queue] = {}
+        self.workers: Dict[int, asyncio.Task] = {}
+        # Replies a worker has dequeued but not yet posted, oldest first, so a
+        # replacement worker can pick them up if the old one never finishes
+        self.taken: Dict[int, List[tuple]] = {}
+
+    def mergeable(self, item: tuple, size: int) -> bool:
+        text, reply_markup, _ = item
+        return (reply_markup is None and not has_open_tags(text)
+                and size + 1 + len(text) <= MAX_MESSAGE_LENGTH)
+
+    async def enqueue(self, chat_id: int, text: str, reply_markup: Optional[Dict] = None):
+        queue = self.queues.get(chat_id)
+        worker = self.workers.get(chat_id)
+        # A worker left behind by a finished request (done, or stranded on another
+        # event loop by a per-request serverless adapter) must be replaced
+        if worker is None or worker.done() or worker.get_loop() is not asyncio.get_running_loop():
+            stale = queue
+            queue = self.queues[chat_id] = asyncio.Queue()
+            while stale is not None and not stale.empty():
+                queue.put_nowait(stale.get_nowait())
+            taken = self.taken[chat_id] = list(self.taken.get(chat_id, []))
+            self.workers[chat_id] = asyncio.create_task(self.flush(chat_id, queue, taken))
+        queue.put_nowait((text, reply_markup, time.monotonic() + UPDATE_TIMEOUT))
+
+    async def flush(self, chat_id: int, queue: asyncio.Queue, taken: List[tuple]):
+        loop = asyncio.get_running_loop()
+        try:
+            while taken or not queue.empty():
+                if not taken:
+                    taken.append(queue.get_nowait())
+                text, reply_markup, deadline = taken[0]
+
+                # Keyboards and unbalanced markup can't be merged, send them as they are
+                if reply_markup is not None or has_open_tags(text):
+                    await self.post(chat_id, text, reply_markup, deadline)
+                    del taken[0]
+                    continue
+
+                parts = [text]
+                size = len(text)
+                # Replies recovered from a replaced worker were already batched
+                for item in taken[1:]:
+                    if not self.mergeable(item, size):
+                        break
+                    parts.append(item[0])
+                    size += 1 + len(item[0])
+
+                if len(taken) == 1:
+                    # Only hold the reply back when there is something to merge it with
+                    if queue.empty():
+                        delay = 0
+                    elif size >= LONG_CHUNK_LENGTH:
+                        delay = LONG_CHUNK_FLUSH_MS / 1000
+                    else:
+                        delay = self.flush_delay
+                    flush_at = loop.time() + delay
+                    while size < FLUSH_LENGTH:
+                        if not queue.empty():
+                            item = queue.get_nowait()
+                        else:
+                            timeout = flush_at - loop.time()
+                            if timeout <= 0:
+                                break
+                            try:
+                                item = await asyncio.wait_for(queue.get(), timeout)
+                            except asyncio.TimeoutError:
+                                break
+                        taken.append(item)
+                        if not self.mergeable(item, size):
+                            break
+                        parts.append(item[0])
+                        size += 1 + len(item[0])
+
+                # The batch is due when its oldest reply is
+                for chunk in split_message("\n".join(parts)):
+                    await self.post(chat_id, chunk, None, deadline)
+                del taken[:len(parts)]
+        finally:
+            # Leave the entries alone if enqueue has already replaced this worker
+            if self.queues.get(chat_id) is queue:
+                dropped = len(taken) + queue.qsize()
+                if dropped:
+                    logger.warning("Dropping %d queued messages for chat %s", dropped, chat_id)
+                del self.queues[chat_id]
+                del self.workers[chat_id]
+                del self.taken[chat_id]
+
+    async def post(self, chat_id: int, text: str, reply_markup: Optional[Dict], deadline: float):
+        """
+        Post a reply within what is left of its delivery deadline, or drop it
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.warning("Dropping reply to chat %s queued over %ss ago", chat_id, UPDATE_TIMEOUT)
+            return
+        await post_message(chat_id, text, reply_markup, timeout=min(OUTBOUND_TIMEOUT, remaining))
+
+    async def drain(self):
+        """
+        Wait for every chat queue to be flushed
+        """
+        await asyncio.gather(*list(self.workers.values()), return_exceptions=True)
+
+outbound = OutboundBatcher()
+
+async def send_message(chat_id: int, text: str, reply_markup: Optional[Dict] = None):
+    """
+    Send a message to Telegram chat, batched with other replies to the same chat
+    """
+    await outbound.enqueue(chat_id, text, reply_markup)
+
+async def post_message(
+    chat_id: int,
+    text: str,
+    reply_markup: Optional[Dict] = None,
+    timeout: float = OUTBOUND_TIMEOUT
+):
+    """
+    Post a single sendMessage call to Telegram
+    """
+    data = {
+        "chat_id": chat_id,
+        "text": text,
+        "parse_mode": "HTML"
+    }
+    
+    if reply_markup:
+        data["reply_markup"] = reply_markup
+    
+    try:
+        return await telegram_call(get_http_client(), SEND_MESSAGE_PATH, data, timeout=timeout)
+    except Exception:
+        logger.exception("Error sending message to chat %s", chat_id)
+        return None
+
+async def send_message_with_keyboard(chat_id: int, text: str, reply_markup_json: bytes):
+    """
+    Send message with inline keyboard, given as pre-serialized reply_markup JSON
+    """
+    # Fragment embeds the bytes as-is when the sendMessage payload is encoded
+    return await send_message(chat_id, text, orjson.Fragment(reply_markup_json))
+
+async def answer_callback_query(callback_query_id: str, text: Optional[str] = None):
+    """
+    Answer callback query from inline keyboard
+    """
+    data = {"callback_query_id": callback_query_id}
+    
+    if text:
+        data["text"] = text
+    
+    try:
+        return await telegram_call(get_http_client(), ANSWER_CB_PATH, data)
+    except Exception:
+        logger.exception("Error answering callback query %s", callback_query_id)
+        return None
@@ -1,61 +1,70 @@
+from contextlib import asynccontextmanager
+import asyncio
 from fastapi import FastAPI, Request, HTTPException, Query
-from fastapi.responses import JSONResponse
-import httpx
-import json
+from fastapi.responses import ORJSONResponse
+import hmac
+import logging
 import os
-from typing import Optional, Dict, Any, List
-from pydantic import BaseModel
-
-# FastAPI app instance
-app = FastAPI(title="Telegram Bot Webhook", version="1.0.0")
+import sys
 
 # Configuration - Use environment variables
-BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', 'YOUR_BOT_TOKEN_HERE')
-WEBHOOK_URL = os.environ.get('WEBHOOK_URL', 'https://your-app.vercel.app/api/telegram_webhook')
-
-# Telegram API base URL
-TELEGRAM_API_BASE = f"https://api.telegram.org/bot{BOT_TOKEN}"
-
-# Pydantic models for type validation
-class TelegramUser(BaseModel):
-    id: int
-    first_name: str
-    last_name: Optional[str] = None
-    username: Optional[str] = None
-
-class TelegramChat(BaseModel):
-    id: int
-    type: str
-    title: Optional[str] = None
-    first_name: Optional[str] = None
-
-class TelegramMessage(BaseModel):
-    message_id: int
-    from_: Optional[TelegramUser] = None
-    chat: TelegramChat
-    date: int
-    text: Optional[str] = None
-    
-    class Config:
-        fields = {'from_': 'from'}
+# Secret Telegram echoes back in X-Telegram-Bot-Api-Secret-Token; checked only when set
+WEBHOOK_SECRET = os.environ.get('TELEGRAM_WEBHOOK_SECRET', '')
+
+# Logging - set LOG_LEVEL=WARNING in production to skip info-level records.
+# Only the app's own logger is configured; the root logger is left alone.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+if LOG_LEVEL not in logging.getLevelNamesMapping():
+    LOG_LEVEL = 'INFO'
+
+logger = logging.getLogger("telegram_webhook")
+logger.setLevel(LOG_LEVEL)
+if not logger.handlers:
+    log_handler = logging.StreamHandler()
+    log_handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+    logger.addHandler(log_handler)
+
+# httpx logs every request URL at INFO, and Bot API URLs contain the token
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+if not WEBHOOK_SECRET:
+    logger.warning("TELEGRAM_WEBHOOK_SECRET is not set; /webhook accepts updates from anyone")
+
+# Run on uvloop wherever it's available (not on Windows); every Telegram call
+# goes through the event loop, so its faster TCP/TLS handling pays off.
+# Under main.py uvicorn's loop="auto" already picks uvloop, so this only matters
+# for runtimes that build their own loop, such as Vercel's. Event loop policies
+# are deprecated from Python 3.14, where those runtimes stay on asyncio's loop.
+if sys.version_info < (3, 14):
+    try:
+        import uvloop
+    except ImportError:
+        pass
+    else:
+        if not isinstance(asyncio.get_event_loop_policy(), uvloop.EventLoopPolicy):
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
-class CallbackQuery(BaseModel):
-    id: str
-    from_: TelegramUser
-    message: Optional[TelegramMessage] = None
-    data: Optional[str] = None
-    
-    class Config:
-        fields = {'from_': 'from'}
+# Telegram handling (httpx, Pydantic models, handlers) lives in api/_telegram.py
+# and is only imported by the routes that need it, keeping /, /health cold starts light
+TELEGRAM_MODULE = "api._telegram"
 
-class TelegramUpdate(BaseModel):
-    update_id: int
-    message: Optional[TelegramMessage] = None
-    callback_query: Optional[CallbackQuery] = None
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        yield
+    finally:
+        # Flush replies and close the shared client, if any request loaded them
+        telegram = sys.modules.get(TELEGRAM_MODULE)
+        if telegram is not None:
+            await telegram.aclose()
 
-# HTTP client for making requests
-async def get_http_client():
-    return httpx.AsyncClient()
+# FastAPI app instance
+app = FastAPI(
+    title="Telegram Bot Webhook",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
 
 @app.get("/")
 async def root():
@@ -75,21 +84,29 @@ async def webhook_handler(request: Request):
     """
     Main webhook endpoint for receiving Telegram updates
     """
+    # Reject non-Telegram traffic before reading or parsing the body
+    if WEBHOOK_SECRET:
+        token = request.headers.get("x-telegram-bot-api-secret-token", "")
+        if not hmac.compare_digest(token.encode(), WEBHOOK_SECRET.encode()):
+            raise HTTPException(status_code=401, detail="Unauthorized")
+
+    from api import _telegram as telegram
+
     try:
         # Parse the request body
-        body = await request.json()
-        update = TelegramUpdate(**body)
-        
-        # Process the update
-        await process_telegram_update(update)
-        
-        return JSONResponse(
+        update = telegram.parse_update(await request.body())
+        if update is None:
+            return {"status": "ignored"}
+
+        telegram.schedule_update(update)
+
+        return ORJSONResponse(
             status_code=200,
             content={"status": "ok"}
         )
-        
-    except Exception as e:
-        print(f"Error processing webhook: {e}")
+
+    except Exception:
+        logger.exception("Error processing webhook")
         raise HTTPException(status_code=400, detail="Bad request")
 
 @app.get("/setup")
@@ -99,225 +116,12 @@ async def webhook_setup(
     """
     Setup webhook endpoint
     - action=set: Set the webhook
-    - action=delete: Delete the webhook  
+    - action=delete: Delete the webhook
     - action=info: Get webhook information
     """
-    try:
-        async with httpx.AsyncClient() as client:
-            if action == "set":
-                # Set webhook
-                url = f"{TELEGRAM_API_BASE}/setWebhook"
-                data = {
-                    "url": f"{WEBHOOK_URL}/webhook",
-                    "allowed_updates": ["message", "callback_query"]
-                }
-                
-                response = await client.post(url, json=data)
-                result = response.json()
-                
-                if result.get("ok"):
-                    return {
-                        "status": "Webhook set successfully",
-                        "webhook_url": f"{WEBHOOK_URL}/webhook",
-                        "result": result
-                    }
-                else:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Failed to set webhook: {result}"
-                    )
-            
-            elif action == "delete":
-                # Delete webhook
-                url = f"{TELEGRAM_API_BASE}/deleteWebhook"
-                response = await client.post(url)
-                result = response.json()
-                
-                return {
-                    "status": "Webhook deleted",
-                    "result": result
-                }
-            
-            else:
-                # Get webhook info
-                url = f"{TELEGRAM_API_BASE}/getWebhookInfo"
-                response = await client.get(url)
-                result = response.json()
-                
-                return {
-                    "webhook_info": result.get("result", {}),
-                    "instructions": {
-                        "set_webhook": f"{WEBHOOK_URL}/setup?action=set",
-                        "delete_webhook": f"{WEBHOOK_URL}/setup?action=delete"
-                    }
-                }
-                
-    except httpx.RequestError as e:
-        raise HTTPException(status_code=500, detail=f"Request error: {e}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-async def process_telegram_update(update: TelegramUpdate):
-    """
-    Process incoming Telegram updates
-    """
-    try:
-        if update.message:
-            await handle_message(update.message)
-        elif update.callback_query:
-            await handle_callback_query(update.callback_query)
-            
-    except Exception as e:
-        print(f"Error processing update: {e}")
-
-async def handle_message(message: TelegramMessage):
-    """
-    Handle text messages
-    """
-    chat_id = message.chat.id
-    text = message.text or ""
-    user_name = message.from_.first_name if message.from_ else "User"
-    
-    # Process different commands
-    if text.startswith('/start'):
-        response_text = f"🤖 Hello {user_name}! Welcome to the bot!\n\nUse /help to see available commands."
-        await send_message(chat_id, response_text)
-        
-    elif text.startswith('/help'):
-        response_text = """
-📋 <b>Available Commands:</b>
-
-/start - Start the bot
-/help - Show this help message  
-/echo [text] - Echo your message
-/status - Check bot status
-/keyboard - Show sample keyboard
-/info - Get your user info
-        """
-        await send_message(chat_id, response_text)
-        
-    elif text.startswith('/echo'):
-        echo_text = text.replace('/echo', '').strip()
-        response_text = f"🔄 You said: <i>{echo_text}</i>" if echo_text else "Please provide text to echo!\n\nExample: <code>/echo Hello World</code>"
-        await send_message(chat_id, response_text)
-        
-    elif text.startswith('/status'):
-        response_text = "✅ Bot is running perfectly!\n\n🚀 FastAPI + Vercel deployment active"
-        await send_message(chat_id, response_text)
-        
-    elif text.startswith('/keyboard'):
-        keyboard = create_sample_keyboard()
-        await send_message_with_keyboard(
-            chat_id, 
-            "🎛️ <b>Sample Keyboard</b>\n\nChoose an option below:",
-            keyboard
-        )
-        
-    elif text.startswith('/info'):
-        if message.from_:
-            info_text = f"""
-👤 <b>Your Information:</b>
-
-🆔 User ID: <code>{message.from_.id}</code>
-👋 Name: {message.from_.first_name}
-💬 Chat ID: <code>{chat_id}</code>
-            """
-            if message.from_.username:
-                info_text += f"📝 Username: @{message.from_.username}\n"
-        else:
-            info_text = "ℹ️ User information not available"
-            
-        await send_message(chat_id, info_text)
-        
-    else:
-        response_text = f"👋 Hello {user_name}!\n\n💬 You sent: <i>{text}</i>\n\nUse /help to see available commands."
-        await send_message(chat_id, response_text)
-
-async def handle_callback_query(callback_query: CallbackQuery):
-    """
-    Handle callback queries from inline keyboards
-    """
-    chat_id = callback_query.message.chat.id if callback_query.message else callback_query.from_.id
-    data = callback_query.data
-    
-    # Process different callback data
-    if data == "btn1":
-        response_text = "🔵 You clicked Button 1!"
-    elif data == "btn2":
-        response_text = "🟢 You clicked Button 2!"
-    elif data == "help":
-        response_text = "❓ This is the help section from inline keyboard!"
-    elif data == "about":
-        response_text = "ℹ️ This bot is built with FastAPI and deployed on Vercel!"
-    else:
-        response_text = f"🎯 You clicked: {data}"
-    
-    await send_message(chat_id, response_text)
-    await answer_callback_query(callback_query.id, "✅ Action completed!")
-
-async def send_message(chat_id: int, text: str, reply_markup: Optional[Dict] = None):
-    """
-    Send a message to Telegram chat
-    """
-    url = f"{TELEGRAM_API_BASE}/sendMessage"
-    data = {
-        "chat_id": chat_id,
-        "text": text,
-        "parse_mode": "HTML"
-    }
-    
-    if reply_markup:
-        data["reply_markup"] = reply_markup
-    
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=data)
-            return response.json()
-    except Exception as e:
-        print(f"Error sending message: {e}")
-        return None
-
-async def send_message_with_keyboard(chat_id: int, text: str, keyboard_buttons: List[List[Dict]]):
-    """
-    Send message with inline keyboard
-    """
-    reply_markup = {
-        "inline_keyboard": keyboard_buttons
-    }
-    return await send_message(chat_id, text, reply_markup)
-
-async def answer_callback_query(callback_query_id: str, text: Optional[str] = None):
-    """
-    Answer callback query from inline keyboard
-    """
-    url = f"{TELEGRAM_API_BASE}/answerCallbackQuery"
-    data = {"callback_query_id": callback_query_id}
-    
-    if text:
-        data["text"] = text
-    
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=data)
-            return response.json()
-    except Exception as e:
-        print(f"Error answering callback query: {e}")
-        return None
+    from api import _telegram as telegram
 
-def create_sample_keyboard():
-    """
-    Create a sample inline keyboard
-    """
-    return [
-        [
-            {"text": "🔵 Button 1", "callback_data": "btn1"},
-            {"text": "🟢 Button 2", "callback_data": "btn2"}
-        ],
-        [
-            {"text": "❓ Help", "callback_data": "help"},
-            {"text": "ℹ️ About", "callback_data": "about"}
-        ]
-    ]
+    return await telegram.webhook_setup(action, WEBHOOK_SECRET)
 
 # Health check endpoint
 @app.get("/health")
@@ -325,5 +129,16 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "telegram-bot-webhook"}
 
+# Routes previously served by the standalone api/index.py app
+@app.get("/api")
+async def api_root():
+    """API info endpoint"""
+    return {"ok": True, "msg": "FastAPI running on Vercel"}
+
+@app.get("/api/health")
+async def api_health():
+    """API health check endpoint"""
+    return {"status": "healthy"}
+
 # For Vercel deployment
-handler = app
\ No newline at end of file
+handler = app
@@ -0,0 +1,29 @@
+"""
+Entry point for running the bot outside Vercel:
+
+    python main.py
+
+which is equivalent to
+
+    uvicorn api.telegram_webhook:app --loop auto --http httptools --workers ${WEB_CONCURRENCY:-1}
+
+uvicorn's "auto" loop picks uvloop when it is installed (it isn't on Windows)
+and falls back to asyncio otherwise.
+
+On Vercel each invocation runs api/telegram_webhook.py in a single worker,
+and the app selects uvloop itself at import time on Python < 3.14. Newer
+Pythons deprecate event loop policies, so Vercel runs them on asyncio's loop.
+"""
+import os
+
+import uvicorn
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "api.telegram_webhook:app",
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", "8000")),
+        loop="auto",
+        http="httptools",
+        workers=int(os.environ.get("WEB_CONCURRENCY", "1"))
+    )
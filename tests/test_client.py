@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from api import _telegram
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    """Start each test without a client or semaphore from an earlier loop"""
+    monkeypatch.setattr(_telegram, "http_client", None)
+    monkeypatch.setattr(_telegram, "outbound_sem", None)
+    monkeypatch.setattr(_telegram, "state_loop", None)
+
+
+async def loop_state():
+    return _telegram.get_http_client(), _telegram.get_outbound_sem()
+
+
+async def reused_state():
+    first = await loop_state()
+    second = await loop_state()
+    await _telegram.aclose()
+    return first, second
+
+
+def test_state_is_reused_on_the_same_loop():
+    first, second = asyncio.run(reused_state())
+
+    assert first[0] is second[0]
+    assert first[1] is second[1]
+    assert first[0].is_closed
+
+
+def test_state_is_rebuilt_on_a_new_loop():
+    first_loop = asyncio.new_event_loop()
+    client, sem = first_loop.run_until_complete(loop_state())
+    first_loop.close()
+
+    async def run():
+        state = await loop_state()
+        await _telegram.aclose()
+        return state
+
+    new_client, new_sem = asyncio.run(run())
+
+    assert new_client is not client
+    assert new_sem is not sem
+    # The stale client is dropped, not closed from the wrong loop
+    assert not client.is_closed
+    assert new_client.is_closed
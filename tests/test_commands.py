@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from api import _telegram
+from api._telegram import ECHO_USAGE_TEXT, START_TEMPLATE, TelegramMessage, handle_message
+
+
+@pytest.fixture
+def replies(monkeypatch):
+    """Record reply texts instead of queueing them for Telegram"""
+    texts = []
+
+    async def fake_send_message(chat_id, text, reply_markup=None):
+        texts.append(text)
+
+    monkeypatch.setattr(_telegram, "send_message", fake_send_message)
+    return texts
+
+
+def reply_to(text):
+    message = TelegramMessage.model_validate({
+        "message_id": 1,
+        "from": {"id": 7, "first_name": "Ann"},
+        "chat": {"id": 42, "type": "private"},
+        "date": 0,
+        "text": text,
+    })
+    asyncio.run(handle_message(message))
+
+
+def test_command_with_bot_username(replies):
+    reply_to("/start@mybot")
+
+    assert replies == [START_TEMPLATE.format(user_name="Ann")]
+
+
+def test_command_name_is_case_insensitive(replies):
+    reply_to("/ECHO hi")
+
+    assert replies == ["🔄 You said: <i>hi</i>"]
+
+
+def test_echo_without_args_replies_with_usage(replies):
+    reply_to("/echo")
+
+    assert replies == [ECHO_USAGE_TEXT]
+
+
+def test_newline_after_command_starts_args(replies):
+    reply_to("/echo\nline two")
+
+    assert replies == ["🔄 You said: <i>line two</i>"]
+
+
+def test_plain_text_goes_to_default_reply(replies):
+    reply_to("hello")
+
+    assert len(replies) == 1
+    assert "You sent: <i>hello</i>" in replies[0]
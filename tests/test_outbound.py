@@ -0,0 +1,211 @@
+import asyncio
+import gc
+
+import pytest
+
+from api import _telegram
+from api._telegram import OutboundBatcher, MAX_MESSAGE_LENGTH, has_open_tags, split_message
+
+KEYBOARD = {"inline_keyboard": [[{"text": "A", "callback_data": "a"}]]}
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Record sendMessage calls instead of posting them to Telegram"""
+    calls = []
+
+    async def fake_post_message(chat_id, text, reply_markup=None, **kwargs):
+        calls.append((chat_id, text, reply_markup))
+
+    monkeypatch.setattr(_telegram, "post_message", fake_post_message)
+    return calls
+
+
+async def enqueue_only(batcher, items, chat_id=1):
+    for text, reply_markup in items:
+        await batcher.enqueue(chat_id, text, reply_markup)
+
+
+async def enqueue_all(batcher, items, chat_id=1):
+    await enqueue_only(batcher, items, chat_id)
+    await batcher.drain()
+
+
+def test_has_open_tags():
+    assert not has_open_tags("plain text")
+    assert not has_open_tags("<b>bold</b> and <i>italic</i>")
+    assert not has_open_tags('<a href="https://example.com">link</a>')
+    assert has_open_tags("<b>unclosed")
+    assert has_open_tags("stray</b>")
+    assert has_open_tags("<b><i>crossed</b></i>")
+
+
+def test_split_message_respects_limit_and_word_boundaries():
+    text = " ".join(["word"] * 2000)
+    chunks = split_message(text)
+
+    assert len(chunks) == 3
+    assert all(len(chunk) <= MAX_MESSAGE_LENGTH for chunk in chunks)
+    assert all(not chunk.startswith(" ") and not chunk.endswith(" ") for chunk in chunks)
+    assert " ".join(chunks) == text
+
+
+def test_split_message_without_spaces_cuts_at_limit():
+    chunks = split_message("x" * (MAX_MESSAGE_LENGTH + 10))
+
+    assert [len(chunk) for chunk in chunks] == [MAX_MESSAGE_LENGTH, 10]
+
+
+def test_short_message_is_left_whole():
+    assert split_message("hello") == ["hello"]
+
+
+def test_split_message_closes_and_reopens_tags():
+    text = "🔄 You said: <i>" + " ".join(["word"] * 900) + "</i>"
+    chunks = split_message(text)
+
+    assert len(chunks) == 2
+    assert all(len(chunk) <= MAX_MESSAGE_LENGTH for chunk in chunks)
+    assert not any(has_open_tags(chunk) for chunk in chunks)
+    assert chunks[0].endswith("</i>")
+    assert chunks[1].startswith("<i>")
+
+
+def test_split_message_never_cuts_inside_a_tag():
+    link = '<a href="https://example.com/a b c">link text</a>'
+    text = " ".join(["w"] * 2040) + " " + link + " tail"
+    chunks = split_message(text)
+
+    assert all(len(chunk) <= MAX_MESSAGE_LENGTH for chunk in chunks)
+    assert not any(has_open_tags(chunk) for chunk in chunks)
+    assert any(link in chunk for chunk in chunks)
+
+
+def test_split_message_never_cuts_inside_an_entity():
+    text = "x" * (MAX_MESSAGE_LENGTH - 2) + "&amp; more"
+    chunks = split_message(text)
+
+    assert chunks == ["x" * (MAX_MESSAGE_LENGTH - 2), "&amp; more"]
+
+
+def test_consecutive_texts_are_merged(sent):
+    asyncio.run(enqueue_all(OutboundBatcher(), [("one", None), ("two", None)]))
+
+    assert sent == [(1, "one\ntwo", None)]
+
+
+def test_keyboard_message_keeps_its_place(sent):
+    items = [("a", None), ("b", None), ("pick", KEYBOARD), ("c", None)]
+    asyncio.run(enqueue_all(OutboundBatcher(), items))
+
+    assert sent == [(1, "a\nb", None), (1, "pick", KEYBOARD), (1, "c", None)]
+    gc.collect()
+
+
+def test_unbalanced_markup_is_sent_alone(sent):
+    items = [("a", None), ("<b>open", None), ("c", None)]
+    asyncio.run(enqueue_all(OutboundBatcher(), items))
+
+    assert sent == [(1, "a", None), (1, "<b>open", None), (1, "c", None)]
+
+
+def test_merged_batch_stays_under_limit(sent):
+    long_text = "y" * 3000
+    asyncio.run(enqueue_all(OutboundBatcher(), [(long_text, None), (long_text, None)]))
+
+    assert sent == [(1, long_text, None), (1, long_text, None)]
+
+
+def test_oversized_text_is_split(sent):
+    text = " ".join(["word"] * 2000)
+    asyncio.run(enqueue_all(OutboundBatcher(), [(text, None)]))
+
+    assert [chunk for _, chunk, _ in sent] == split_message(text)
+
+
+def test_oversized_markup_reply_is_sent_balanced(sent):
+    text = "🔄 You said: <i>" + " ".join(["word"] * 900) + "</i>"
+    asyncio.run(enqueue_all(OutboundBatcher(), [(text, None)]))
+
+    chunks = [chunk for _, chunk, _ in sent]
+    assert len(chunks) == 2
+    assert not any(has_open_tags(chunk) for chunk in chunks)
+
+
+def test_single_reply_skips_flush_delay(sent):
+    async def run():
+        batcher = OutboundBatcher(flush_ms=60_000)
+        await batcher.enqueue(1, "only", None)
+        await asyncio.wait_for(batcher.drain(), timeout=1.0)
+
+    asyncio.run(run())
+
+    assert sent == [(1, "only", None)]
+
+
+def test_worker_stranded_on_another_loop_is_replaced(sent):
+    batcher = OutboundBatcher()
+
+    # A per-request adapter runs the loop only until the response is done,
+    # leaving this worker suspended in its flush window on a dead loop
+    first_loop = asyncio.new_event_loop()
+    first_loop.run_until_complete(enqueue_only(batcher, [("a", None), ("b", None)]))
+    first_loop.run_until_complete(asyncio.sleep(0))
+    stranded = batcher.workers[1]
+    assert not stranded.done()
+    assert [text for text, _, _ in batcher.taken[1]] == ["a", "b"]
+
+    asyncio.run(enqueue_all(batcher, [("c", None)]))
+
+    # The replies the stranded worker had already dequeued are not lost
+    assert sent == [(1, "a\nb", None), (1, "c", None)]
+    assert batcher.workers == {}
+    assert batcher.queues == {}
+    assert batcher.taken == {}
+
+    stranded.cancel()
+    first_loop.run_until_complete(asyncio.sleep(0))
+    first_loop.close()
+
+
+def test_reply_past_deadline_is_dropped(sent, monkeypatch):
+    monkeypatch.setattr(_telegram, "UPDATE_TIMEOUT", 0)
+    asyncio.run(enqueue_all(OutboundBatcher(), [("late", None), ("pick", KEYBOARD)]))
+
+    assert sent == []
+
+
+def test_post_timeout_is_capped_by_deadline(monkeypatch):
+    timeouts = []
+
+    async def slow_post_message(chat_id, text, reply_markup=None, timeout=None):
+        timeouts.append(timeout)
+        await asyncio.sleep(0.2)
+
+    monkeypatch.setattr(_telegram, "post_message", slow_post_message)
+    monkeypatch.setattr(_telegram, "UPDATE_TIMEOUT", 0.3)
+    items = [("a", KEYBOARD), ("b", KEYBOARD), ("c", KEYBOARD)]
+    asyncio.run(enqueue_all(OutboundBatcher(), items))
+
+    # The third reply is already past its deadline after two slow posts
+    assert len(timeouts) == 2
+    assert timeouts[0] <= 0.3
+    # asyncio.sleep can wake slightly early, so allow some slack on the remainder
+    assert timeouts[1] < 0.15
+
+
+# The abandoned worker coroutine is garbage collected against its closed loop
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnraisableExceptionWarning")
+def test_stranded_worker_blocked_item_keeps_its_order(sent):
+    batcher = OutboundBatcher()
+
+    # The loop is closed outright, as when the adapter tears it down
+    first_loop = asyncio.new_event_loop()
+    first_loop.run_until_complete(enqueue_only(batcher, [("a", None), ("b", None)]))
+    first_loop.run_until_complete(asyncio.sleep(0))
+    first_loop.close()
+
+    asyncio.run(enqueue_all(batcher, [("pick", KEYBOARD), ("c", None)]))
+
+    assert sent == [(1, "a\nb", None), (1, "pick", KEYBOARD), (1, "c", None)]
+    gc.collect()
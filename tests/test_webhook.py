@@ -0,0 +1,119 @@
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from api import _telegram
+from api import telegram_webhook
+
+SECRET = "s3cret"
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "from": {"id": 7, "first_name": "Ann"},
+        "chat": {"id": 42, "type": "private"},
+        "date": 0,
+        "text": "/start",
+    },
+}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(telegram_webhook, "WEBHOOK_SECRET", SECRET)
+    return TestClient(telegram_webhook.app)
+
+
+@pytest.fixture
+def scheduled(monkeypatch):
+    """Record scheduled updates instead of handling them"""
+    updates = []
+    monkeypatch.setattr(_telegram, "schedule_update", updates.append)
+    return updates
+
+
+@pytest.mark.parametrize("headers", [{}, {SECRET_HEADER: "wrong"}])
+def test_webhook_rejects_missing_or_wrong_secret(client, scheduled, headers):
+    response = client.post("/webhook", json=UPDATE, headers=headers)
+
+    assert response.status_code == 401
+    assert scheduled == []
+
+
+def test_webhook_rejection_skips_reading_the_body(client, monkeypatch):
+    calls = []
+
+    async def body(self):
+        calls.append("body")
+        return b""
+
+    def parse_update(raw):
+        calls.append("parse")
+
+    monkeypatch.setattr(Request, "body", body)
+    monkeypatch.setattr(_telegram, "parse_update", parse_update)
+    response = client.post("/webhook", json=UPDATE, headers={SECRET_HEADER: "wrong"})
+
+    assert response.status_code == 401
+    assert calls == []
+
+
+def test_webhook_accepts_matching_secret(client, scheduled):
+    response = client.post("/webhook", json=UPDATE, headers={SECRET_HEADER: SECRET})
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+    assert [update.update_id for update in scheduled] == [1]
+
+
+def test_setup_set_sends_secret_token(client, monkeypatch):
+    calls = []
+
+    async def fake_telegram_call(http_client, path, data=None, **kwargs):
+        calls.append((path, data))
+        return {"ok": True}
+
+    monkeypatch.setattr(_telegram, "telegram_call", fake_telegram_call)
+    response = client.get("/setup", params={"action": "set"})
+
+    assert response.status_code == 200
+    assert calls[0][0] == _telegram.SET_WEBHOOK_PATH
+    assert calls[0][1]["secret_token"] == SECRET
+
+
+def test_parse_update_ignores_message_without_text():
+    message = {key: value for key, value in UPDATE["message"].items() if key != "text"}
+    update = {"update_id": 1, "message": message}
+
+    assert _telegram.parse_update(orjson.dumps(update)) is None
+
+
+def test_parse_update_ignores_other_update_types():
+    update = {"update_id": 1, "edited_message": UPDATE["message"]}
+
+    assert _telegram.parse_update(orjson.dumps(update)) is None
+
+
+def test_parse_update_validates_callback_query_sender():
+    update = {
+        "update_id": 2,
+        "callback_query": {
+            "id": "q1",
+            "from": {"id": 7, "first_name": "Ann"},
+            "data": "btn1",
+        },
+    }
+    parsed = _telegram.parse_update(orjson.dumps(update))
+
+    assert parsed.callback_query.from_.id == 7
+    assert parsed.callback_query.data == "btn1"
+
+
+@pytest.mark.parametrize("body", [b"5", b'{"message": null}', b'"message"', b"[]"])
+def test_webhook_rejects_non_object_bodies(client, scheduled, body):
+    response = client.post("/webhook", content=body, headers={SECRET_HEADER: SECRET})
+
+    assert response.status_code == 400
+    assert scheduled == []